@@ -5,14 +5,26 @@ Manages certificates for IoT MQTT mTLS authentication
 
 import streamlit as st
 import subprocess
+import asyncio
 import os
+import re
+import shutil
 import json
 import io
+import base64
+import hashlib
 import zipfile
-from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
+import requests
+from requests.adapters import HTTPAdapter
+import numpy as np
+import pandas as pd
 from cryptography import x509
 from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import serialization
 
 # Configuration
 STEP_CA_URL = os.environ.get("STEP_CA_URL", "https://step-ca:9000")
@@ -22,6 +34,27 @@ CA_BUNDLE = "/home/step/certs/ca-bundle.crt"
 CERTS_DIR = Path("/app/certs")
 PROVISIONER_PASSWORD_FILE = "/home/step/secrets/password"
 
+# step CLI flags shared by every provisioner-authenticated command
+STEP_PROVISIONER_FLAGS = (
+    "--ca-url", STEP_CA_URL,
+    "--root", STEP_CA_ROOT,
+    "--provisioner", "iot-devices",
+    "--provisioner-password-file", PROVISIONER_PASSWORD_FILE
+)
+STEP_ISSUE_FLAGS = STEP_PROVISIONER_FLAGS + ("--force",)
+
+# `step ca token` one-time tokens are valid for 5 minutes by default;
+# cached revoke tokens older than this are minted again
+REVOKE_TOKEN_MAX_AGE = timedelta(minutes=4)
+
+# Columns of the certificate listing, see list_certificates()
+CERT_COLUMNS = ("cn", "issued", "expires", "serial", "status", "_expires_dt")
+
+# Allowed certificate names (also used as directory and file names):
+# letters, numbers, "-", "_" and ".", with at least one letter or number.
+# Requiring a letter or number is what rejects "." and ".." (path traversal).
+COMMON_NAME_PATTERN = re.compile(r"[A-Za-z0-9._-]*[A-Za-z0-9][A-Za-z0-9._-]*")
+
 # Ensure certs directory exists
 CERTS_DIR.mkdir(parents=True, exist_ok=True)
 
@@ -49,32 +82,74 @@ def run_step_command(args: list, capture_output: bool = True) -> subprocess.Comp
     return result
 
 
+async def run_step_command_async(args: list) -> subprocess.CompletedProcess:
+    """Execute a step CLI command without blocking the event loop."""
+    env = os.environ.copy()
+    env["STEPPATH"] = "/home/step"
+
+    cmd = ["step"] + args
+    process = await asyncio.create_subprocess_exec(
+        *cmd,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        env=env
+    )
+    stdout, stderr = await process.communicate()
+    return subprocess.CompletedProcess(cmd, process.returncode, stdout.decode(), stderr.decode())
+
+
+@st.cache_resource(show_spinner=False)
+def ca_session() -> requests.Session:
+    """
+    HTTPS session to the step-ca REST API, shared across reruns and users
+    so the TCP+TLS connection to step-ca stays warm.
+    """
+    session = requests.Session()
+    session.verify = STEP_CA_ROOT
+    session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=4))
+    return session
+
+
+def ca_error_message(response: requests.Response) -> str:
+    """Extract the error message from a step-ca API error response."""
+    try:
+        return response.json().get("message", response.text)
+    except ValueError:
+        return response.text
+
+
 def get_ca_health() -> dict:
-    """Check CA health status."""
+    """Check CA health status. Not cached itself; _snapshot() caches it."""
     try:
-        result = run_step_command([
-            "ca", "health",
-            "--ca-url", STEP_CA_URL,
-            "--root", STEP_CA_ROOT
-        ])
-        if result.returncode == 0:
+        response = ca_session().get(f"{STEP_CA_URL}/health", timeout=10)
+        if response.ok:
             return {"status": "healthy", "message": "CA is running"}
         else:
-            return {"status": "unhealthy", "message": result.stderr}
+            return {"status": "unhealthy", "message": ca_error_message(response)}
     except Exception as e:
         return {"status": "error", "message": str(e)}
 
 
+@st.cache_resource(show_spinner=False)
+def _ca_fingerprint() -> str:
+    """
+    CA root fingerprint, computed once for the lifetime of the CA.
+    Same value as `step certificate fingerprint`: SHA-256 of the DER certificate.
+    """
+    cert = x509.load_pem_x509_certificate(Path(STEP_CA_ROOT).read_bytes(), default_backend())
+    return hashlib.sha256(cert.public_bytes(serialization.Encoding.DER)).hexdigest()
+
+
+@st.cache_resource
+def _ca_bundle_bytes() -> bytes:
+    """CA bundle (intermediate + root) contents, read once and served as-is."""
+    return Path(CA_BUNDLE).read_bytes()
+
+
 def get_ca_fingerprint() -> str:
     """Get CA root certificate fingerprint."""
     try:
-        result = run_step_command([
-            "certificate", "fingerprint",
-            STEP_CA_ROOT
-        ])
-        if result.returncode == 0:
-            return result.stdout.strip()
-        return "Unable to get fingerprint"
+        return _ca_fingerprint()
     except Exception as e:
         return f"Error: {e}"
 
@@ -88,15 +163,17 @@ def get_provisioner_password() -> str:
         return ""
 
 
-def issue_certificate(
+async def issue_certificate(
     common_name: str,
     cert_type: str,
     validity_days: int,
     sans: list = None
-) -> tuple[bool, str, dict]:
+) -> tuple[bool, str, dict, bytes]:
     """
     Issue a new certificate.
-    Returns: (success, message, files_dict)
+    Returns: (success, message, files_dict, zip_bundle)
+
+    Async so several issuances can run concurrently with asyncio.gather().
     """
     cert_dir = CERTS_DIR / common_name
     cert_dir.mkdir(parents=True, exist_ok=True)
@@ -104,75 +181,318 @@ def issue_certificate(
     cert_file = cert_dir / f"{common_name}.crt"
     key_file = cert_dir / f"{common_name}.key"
 
-    # Build command
+    # Build command; only the positional args, validity and SANs vary
     cmd = [
         "ca", "certificate",
         common_name,
         str(cert_file),
         str(key_file),
-        "--ca-url", STEP_CA_URL,
-        "--root", STEP_CA_ROOT,
-        "--not-after", f"{validity_days * 24}h",
-        "--provisioner", "iot-devices",
-        "--provisioner-password-file", PROVISIONER_PASSWORD_FILE,
-        "--force"
+        *STEP_ISSUE_FLAGS,
+        "--not-after", f"{validity_days * 24}h"
     ]
 
     # Add SANs for server certificates
-    if sans:
-        for san in sans:
-            if san.strip():
-                cmd.extend(["--san", san.strip()])
+    cmd.extend(arg for san in (sans or []) if san.strip() for arg in ("--san", san.strip()))
 
-    result = run_step_command(cmd)
+    result = await run_step_command_async(cmd)
 
     if result.returncode == 0:
         # Read generated files
         files = {}
         try:
-            with open(cert_file, "r") as f:
-                files["cert"] = f.read()
-            with open(key_file, "r") as f:
-                files["key"] = f.read()
-            with open(CA_BUNDLE, "r") as f:
-                files["ca"] = f.read()  # Includes intermediate + root for mTLS
-            return True, "Certificate issued successfully", files
+            # CA bundle is read fresh, not from the cache, so a renewed
+            # intermediate is picked up by the next issuance
+            files["cert"], files["key"], files["ca"] = await asyncio.gather(
+                asyncio.to_thread(cert_file.read_text),
+                asyncio.to_thread(key_file.read_text),
+                asyncio.to_thread(Path(CA_BUNDLE).read_text)  # Includes intermediate + root for mTLS
+            )
         except Exception as e:
-            return False, f"Error reading files: {e}", {}
+            return False, f"Error reading files: {e}", {}, b""
+        # Build the bundle right away from the contents already in memory
+        bundle = create_cert_bundle(common_name, files)
+        return True, "Certificate issued successfully", files, bundle
     else:
-        return False, f"Error: {result.stderr}", {}
-
-
-def list_certificates() -> list:
-    """List all issued certificates from certs directory."""
-    certs = []
-
-    for cert_dir in CERTS_DIR.iterdir():
-        if cert_dir.is_dir():
-            cert_file = cert_dir / f"{cert_dir.name}.crt"
-            if cert_file.exists():
-                try:
-                    with open(cert_file, "rb") as f:
-                        cert_data = f.read()
-                    cert = x509.load_pem_x509_certificate(cert_data, default_backend())
-
-                    certs.append({
-                        "cn": cert_dir.name,
-                        "issued": cert.not_valid_before_utc.strftime("%Y-%m-%d %H:%M"),
-                        "expires": cert.not_valid_after_utc.strftime("%Y-%m-%d %H:%M"),
-                        "serial": str(cert.serial_number),  # Decimal format for step CLI
-                        "status": "Active" if cert.not_valid_after_utc > datetime.now(cert.not_valid_after_utc.tzinfo) else "Expired"
-                    })
-                except Exception as e:
-                    certs.append({
-                        "cn": cert_dir.name,
-                        "issued": "Unknown",
-                        "expires": "Unknown",
-                        "serial": "Unknown",
-                        "status": f"Error: {e}"
-                    })
-
-    return sorted(certs, key=lambda x: x["cn"])
+        return False, f"Error: {result.stderr}", {}, b""
+
+
+def certs_dir_mtime() -> float:
+    """Latest mtime across the certs directory and its entries.
+
+    Used as the cache key for list_certificates() so the cached listing
+    is dropped as soon as a certificate directory is added or revoked
+    (renamed). Re-issuing an existing CN rewrites the files in place
+    without touching these mtimes, so issuance clears the cache itself.
+    """
+    mtimes = [CERTS_DIR.stat().st_mtime]
+    with os.scandir(CERTS_DIR) as entries:
+        for entry in entries:
+            try:
+                mtimes.append(entry.stat().st_mtime)
+            except FileNotFoundError:
+                pass  # Renamed or removed since the listing (e.g. revoked)
+    return max(mtimes)
+
+
+def _der_header(der: bytes, pos: int) -> tuple[int, int, int]:
+    """Read the DER tag/length at pos. Returns (tag, content_start, content_end)."""
+    tag = der[pos]
+    length = der[pos + 1]
+    pos += 2
+    if length & 0x80:
+        num_bytes = length & 0x7F
+        if not 0 < num_bytes <= 4:
+            raise ValueError("Unsupported DER length encoding")
+        length = int.from_bytes(der[pos:pos + num_bytes], "big")
+        pos += num_bytes
+    end = pos + length
+    if end > len(der):
+        raise ValueError("Truncated DER element")
+    return tag, pos, end
+
+
+def _der_time(tag: int, value: bytes) -> datetime:
+    """Decode a DER UTCTime or GeneralizedTime value as an aware UTC datetime."""
+    text = value.decode("ascii")
+    if tag == 0x17:
+        # UTCTime: two-digit year, 50-99 means 19xx (RFC 5280 4.1.2.5.1)
+        text = ("19" if int(text[:2]) >= 50 else "20") + text
+    elif tag != 0x18:
+        raise ValueError(f"Unexpected time tag 0x{tag:02x}")
+    return datetime.strptime(text, "%Y%m%d%H%M%SZ").replace(tzinfo=timezone.utc)
+
+
+def _fast_cert_meta(pem_bytes: bytes) -> tuple[int, datetime, datetime]:
+    """
+    Extract (serial, not_before, not_after) from the first PEM certificate.
+
+    Walks only the DER headers needed to reach serialNumber and validity
+    in the TBSCertificate instead of fully parsing the certificate.
+    Raises ValueError/IndexError on anything unexpected.
+    """
+    begin = pem_bytes.index(b"-----BEGIN CERTIFICATE-----") + 27
+    end = pem_bytes.index(b"-----END CERTIFICATE-----", begin)
+    der = base64.b64decode(pem_bytes[begin:end])
+
+    tag, pos, _ = _der_header(der, 0)  # Certificate
+    if tag != 0x30:
+        raise ValueError("Certificate is not a SEQUENCE")
+    tag, pos, _ = _der_header(der, pos)  # TBSCertificate
+    if tag != 0x30:
+        raise ValueError("TBSCertificate is not a SEQUENCE")
+
+    tag, start, end = _der_header(der, pos)
+    if tag == 0xA0:  # [0] version, optional
+        tag, start, end = _der_header(der, end)
+    if tag != 0x02:
+        raise ValueError("Missing serialNumber")
+    serial = int.from_bytes(der[start:end], "big", signed=True)
+
+    _, _, end = _der_header(der, end)  # signature AlgorithmIdentifier
+    _, _, end = _der_header(der, end)  # issuer Name
+    tag, pos, _ = _der_header(der, end)  # validity
+    if tag != 0x30:
+        raise ValueError("Validity is not a SEQUENCE")
+
+    tag, start, end = _der_header(der, pos)
+    not_before = _der_time(tag, der[start:end])
+    tag, start, end = _der_header(der, end)
+    not_after = _der_time(tag, der[start:end])
+
+    return serial, not_before, not_after
+
+
+@st.cache_resource(show_spinner=False)
+def _cert_meta_cache() -> dict:
+    """
+    Parsed certificate metadata shared across reruns, keyed by directory name:
+    {name: ((st_mtime_ns, st_size), (serial, not_before, not_after) or error message)}
+    """
+    return {}
+
+
+def _read_cert_meta(cert_file: Path) -> tuple[int, datetime, datetime]:
+    """Read (serial, not_before, not_after) from a certificate file."""
+    with open(cert_file, "rb") as f:
+        cert_data = f.read()
+    try:
+        return _fast_cert_meta(cert_data)
+    except (ValueError, IndexError):
+        cert = x509.load_pem_x509_certificate(cert_data, default_backend())
+        return cert.serial_number, cert.not_valid_before_utc, cert.not_valid_after_utc
+
+
+def _load_one(cert_dir: os.DirEntry, meta_cache: dict) -> dict | None:
+    """
+    Build the listing row for one certificate directory (None if it has no .crt).
+    The file is only read and parsed again when its mtime or size changed.
+    """
+    cert_file = Path(cert_dir.path) / f"{cert_dir.name}.crt"
+    try:
+        stat = cert_file.stat()
+    except FileNotFoundError:
+        return None
+
+    file_key = (stat.st_mtime_ns, stat.st_size)
+    cached = meta_cache.get(cert_dir.name)
+    if cached is not None and cached[0] == file_key:
+        meta = cached[1]
+    else:
+        try:
+            meta = _read_cert_meta(cert_file)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            meta = f"Error: {e}"
+        meta_cache[cert_dir.name] = (file_key, meta)
+
+    if isinstance(meta, str):
+        return {
+            "cn": cert_dir.name,
+            "issued": "Unknown",
+            "expires": "Unknown",
+            "serial": "Unknown",
+            "status": meta,
+            "_expires_dt": None
+        }
+
+    serial, not_before, not_after = meta
+    return {
+        "cn": cert_dir.name,
+        "issued": not_before.strftime("%Y-%m-%d %H:%M"),
+        "expires": not_after.strftime("%Y-%m-%d %H:%M"),
+        "serial": str(serial),  # Decimal format for step CLI
+        "status": "Active" if not_after > datetime.now(timezone.utc) else "Expired",
+        "_expires_dt": not_after  # For comparisons; hidden in tables
+    }
+
+
+@st.cache_data(ttl=30, show_spinner=False)
+def list_certificates(dir_mtime: float) -> dict:
+    """List all issued certificates from certs directory.
+
+    Returns one list per column in CERT_COLUMNS, sorted by CN, so pages can
+    filter and count on whole columns and hand it to pandas as-is.
+    dir_mtime is only used as part of the cache key, see certs_dir_mtime().
+    """
+    # scandir() gets the entry type from the directory listing itself,
+    # avoiding a stat() per entry
+    with os.scandir(CERTS_DIR) as entries:
+        cert_dirs = [e for e in entries if e.is_dir()]
+
+    meta_cache = _cert_meta_cache()
+    # Forget directories that are gone (e.g. renamed to .revoked)
+    for name in set(meta_cache) - {e.name for e in cert_dirs}:
+        meta_cache.pop(name, None)
+
+    if not cert_dirs:
+        return {column: [] for column in CERT_COLUMNS}
+
+    # Certificates are independent; overlap the file reads
+    with ThreadPoolExecutor(max_workers=min(32, len(cert_dirs))) as executor:
+        certs = [
+            c for c in executor.map(partial(_load_one, meta_cache=meta_cache), cert_dirs)
+            if c is not None
+        ]
+
+    certs.sort(key=lambda x: x["cn"])
+    return {column: [c[column] for c in certs] for column in CERT_COLUMNS}
+
+
+@st.cache_data(ttl=10)
+def _snapshot(dir_mtime: float) -> tuple[dict, str, dict]:
+    """
+    CA health, CA fingerprint and certificate list, fetched concurrently so a
+    page waits for the slowest of them rather than for their sum.
+    Returns: (health, fingerprint, certs)
+
+    The 10 second TTL is the only cache on the health check, so the health
+    shown is never older than that.
+
+    Only used by the Dashboard, which needs step-ca anyway; it also warms the
+    fingerprint cache for CA Settings. Other pages call list_certificates()
+    or get_ca_fingerprint() directly so an unreachable CA cannot stall them.
+    dir_mtime is passed on to list_certificates(), see certs_dir_mtime().
+    """
+    # The cached functions run here are declared with show_spinner=False:
+    # the spinner is an st element and the workers have no script context
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        health = executor.submit(get_ca_health)
+        fingerprint = executor.submit(get_ca_fingerprint)
+        certs = executor.submit(list_certificates, dir_mtime)
+        return health.result(), fingerprint.result(), certs.result()
+
+
+def revoke_token_args(serial: str) -> list:
+    """step CLI arguments to mint a revocation token for a serial number."""
+    # Note: subject (serial) must come before flags
+    return ["ca", "token", serial, "--revoke", *STEP_PROVISIONER_FLAGS]
+
+
+def cached_revoke_token(serial: str) -> str | None:
+    """
+    Cached revocation token for a serial, or None if there is none or it is
+    too old to still be accepted by step-ca (expired ones are dropped).
+    """
+    tokens = st.session_state.setdefault("revoke_tokens", {})
+    cached = tokens.get(serial)
+    if cached is None:
+        return None
+    token, minted_at = cached
+    if datetime.now(timezone.utc) - minted_at > REVOKE_TOKEN_MAX_AGE:
+        tokens.pop(serial, None)
+        return None
+    return token
+
+
+def get_revoke_token(serial: str) -> tuple[bool, str]:
+    """
+    Get a revocation token for a serial number.
+    Returns: (success, token or error message)
+
+    Tokens are cached per serial in st.session_state so a revoke that never
+    reached step-ca can be retried without minting a new one. They are
+    one-time tokens bound to a single serial, so they cannot be shared
+    across certificates and are dropped once step-ca has seen them or they
+    are older than REVOKE_TOKEN_MAX_AGE.
+    """
+    token = cached_revoke_token(serial)
+    if token is not None:
+        return True, token
+
+    result = run_step_command(revoke_token_args(serial))
+    if result.returncode != 0:
+        return False, f"Failed to generate revocation token: {result.stderr}"
+
+    token = result.stdout.strip()
+    st.session_state.revoke_tokens[serial] = (token, datetime.now(timezone.utc))
+    return True, token
+
+
+async def prefetch_revoke_tokens(serials: list, max_concurrent: int = 4) -> dict:
+    """
+    Mint the missing revocation tokens for serials concurrently.
+    Returns: {serial: error message} for the serials that failed
+
+    Each `step ca token` decrypts the provisioner key, so at most
+    max_concurrent of them run at a time.
+    """
+    missing = [serial for serial in serials if cached_revoke_token(serial) is None]
+    semaphore = asyncio.Semaphore(max_concurrent)
+
+    async def mint(serial: str) -> subprocess.CompletedProcess:
+        async with semaphore:
+            return await run_step_command_async(revoke_token_args(serial))
+
+    results = await asyncio.gather(*(mint(serial) for serial in missing))
+
+    errors = {}
+    for serial, result in zip(missing, results):
+        if result.returncode == 0:
+            st.session_state.revoke_tokens[serial] = (result.stdout.strip(), datetime.now(timezone.utc))
+        else:
+            errors[serial] = f"Failed to generate revocation token: {result.stderr}"
+    return errors
 
 
 def revoke_certificate(common_name: str, serial: str) -> tuple[bool, str]:
@@ -182,44 +502,39 @@ def revoke_certificate(common_name: str, serial: str) -> tuple[bool, str]:
     if not cert_file.exists():
         return False, "Certificate file not found"
 
-    # Step 1: Generate a revocation token using provisioner
-    # Note: subject (serial) must come before flags
-    token_cmd = [
-        "ca", "token",
-        serial,
-        "--revoke",
-        "--ca-url", STEP_CA_URL,
-        "--root", STEP_CA_ROOT,
-        "--provisioner", "iot-devices",
-        "--provisioner-password-file", PROVISIONER_PASSWORD_FILE
-    ]
-
-    token_result = run_step_command(token_cmd)
-    if token_result.returncode != 0:
-        return False, f"Failed to generate revocation token: {token_result.stderr}"
+    # Step 1: Get a revocation token for this serial
+    success, token = get_revoke_token(serial)
+    if not success:
+        return False, token
 
-    token = token_result.stdout.strip()
+    # Step 2: Revoke using the token (passive revocation, same as `step ca revoke`)
+    try:
+        response = ca_session().post(
+            f"{STEP_CA_URL}/1.0/revoke",
+            json={"serial": serial, "ott": token, "reasonCode": 0, "passive": True},
+            timeout=30
+        )
+    except (requests.ConnectionError, requests.ConnectTimeout) as e:
+        # Could not reach step-ca, keep the token for a retry
+        return False, f"Error: {e}"
+    except requests.RequestException as e:
+        # e.g. a read timeout: step-ca may already have consumed the token
+        st.session_state.revoke_tokens.pop(serial, None)
+        return False, f"Error: {e}"
 
-    # Step 2: Revoke using the token
-    revoke_cmd = [
-        "ca", "revoke",
-        serial,
-        "--ca-url", STEP_CA_URL,
-        "--root", STEP_CA_ROOT,
-        "--token", token
-    ]
+    # One-time token: step-ca has either consumed or rejected it
+    st.session_state.revoke_tokens.pop(serial, None)
 
-    result = run_step_command(revoke_cmd)
+    error = "" if response.ok else ca_error_message(response)
 
     # Check if already revoked (still counts as success for cleanup)
-    already_revoked = "already revoked" in result.stderr.lower()
+    already_revoked = "already revoked" in error.lower()
 
-    if result.returncode == 0 or already_revoked:
+    if response.ok or already_revoked:
         # Mark as revoked by renaming directory
         revoked_dir = CERTS_DIR / f"{common_name}.revoked"
         # Handle case where .revoked already exists
         if revoked_dir.exists():
-            import shutil
             shutil.rmtree(revoked_dir)
         try:
             (CERTS_DIR / common_name).rename(revoked_dir)
@@ -229,20 +544,25 @@ def revoke_certificate(common_name: str, serial: str) -> tuple[bool, str]:
             return True, "Certificate was already revoked. Cleaned up local files."
         return True, "Certificate revoked successfully"
     else:
-        return False, f"Error: {result.stderr}"
+        return False, f"Error: {error}"
 
 
-def create_cert_bundle(common_name: str, files: dict) -> bytes:
-    """Create a ZIP bundle with all certificate files."""
-    buffer = io.BytesIO()
+def stored_zip_size(entries: dict) -> int:
+    """
+    Exact size of a ZIP_STORED archive of {name: bytes} as written by zipfile:
+    local header (30) + central directory record (46) + name twice per entry,
+    plus the end of central directory record (22). No ZIP64 for small files.
+    """
+    size = 22
+    for name, data in entries.items():
+        size += 30 + 46 + 2 * len(name.encode()) + len(data)
+    return size
 
-    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zf:
-        zf.writestr(f"{common_name}/ca.crt", files["ca"])
-        zf.writestr(f"{common_name}/{common_name}.crt", files["cert"])
-        zf.writestr(f"{common_name}/{common_name}.key", files["key"])
 
-        # Add a README for the bundle
-        readme = f"""Certificate Bundle for {common_name}
+def create_cert_bundle(common_name: str, files: dict) -> bytes:
+    """Create a ZIP bundle with all certificate files."""
+    # Add a README for the bundle
+    readme = f"""Certificate Bundle for {common_name}
 ========================================
 
 Files included:
@@ -257,52 +577,57 @@ For Mosquitto bridge configuration:
 
 Generated: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
 """
-        zf.writestr(f"{common_name}/README.txt", readme)
-
-    buffer.seek(0)
+    entries = {
+        f"{common_name}/ca.crt": files["ca"].encode(),
+        f"{common_name}/{common_name}.crt": files["cert"].encode(),
+        f"{common_name}/{common_name}.key": files["key"].encode(),
+        f"{common_name}/README.txt": readme.encode()
+    }
+
+    # Pre-size the buffer to the final archive size so it never regrows
+    buffer = io.BytesIO(bytearray(stored_zip_size(entries)))
+
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_STORED) as zf:
+        for name, data in entries.items():
+            zf.writestr(name, data)
+
+    # No-op when the size was exact; guards against a short archive
+    buffer.truncate()
     return buffer.getvalue()
 
 
-# Sidebar navigation
-page = st.sidebar.radio(
-    "Navigation",
-    ["Dashboard", "Issue Certificate", "View Certificates", "Revoke Certificate", "CA Settings"]
-)
-
-# Dashboard page
-if page == "Dashboard":
-    st.header("Dashboard")
+@st.fragment(run_every=30)
+def dashboard():
+    """
+    Dashboard body. Runs as a fragment so it refreshes on its own every
+    30 seconds without rerunning the rest of the script.
+    """
+    health, _, certs = _snapshot(certs_dir_mtime())
 
     col1, col2, col3 = st.columns(3)
 
     # CA Health
     with col1:
         st.subheader("CA Status")
-        health = get_ca_health()
         if health["status"] == "healthy":
             st.success("Healthy")
         else:
             st.error(f"Unhealthy: {health['message']}")
 
+    # Count active and expiring certificates on whole columns
+    expiry_cutoff = datetime.now(timezone.utc) + timedelta(days=7)
+    active_mask = np.array(certs["status"], dtype=str) == "Active"
+    active = int(active_mask.sum())
+    expiring = int((np.array(certs["_expires_dt"], dtype=object)[active_mask] < expiry_cutoff).sum())
+
     # Certificate count
     with col2:
         st.subheader("Certificates")
-        certs = list_certificates()
-        active = len([c for c in certs if c["status"] == "Active"])
         st.metric("Active", active)
 
     # Expiring soon
     with col3:
         st.subheader("Expiring Soon")
-        expiring = 0
-        for cert in certs:
-            if cert["status"] == "Active" and cert["expires"] != "Unknown":
-                try:
-                    exp_date = datetime.strptime(cert["expires"], "%Y-%m-%d %H:%M")
-                    if exp_date < datetime.now() + timedelta(days=7):
-                        expiring += 1
-                except:
-                    pass
         if expiring > 0:
             st.warning(f"{expiring} expiring in 7 days")
         else:
@@ -310,15 +635,29 @@ if page == "Dashboard":
 
     # Recent certificates
     st.subheader("Recent Certificates")
-    if certs:
+    if certs["cn"]:
         st.dataframe(
-            certs[:10],
+            pd.DataFrame(certs).head(10),
             width='stretch',
-            hide_index=True
+            hide_index=True,
+            column_config={"_expires_dt": None}
         )
     else:
         st.info("No certificates issued yet")
 
+
+# Sidebar navigation
+page = st.sidebar.radio(
+    "Navigation",
+    ["Dashboard", "Issue Certificate", "View Certificates", "Revoke Certificate", "CA Settings"]
+)
+
+# Dashboard page
+if page == "Dashboard":
+    st.header("Dashboard")
+
+    dashboard()
+
 # Issue Certificate page
 elif page == "Issue Certificate":
     st.header("Issue New Certificate")
@@ -360,7 +699,7 @@ elif page == "Issue Certificate":
         if submitted:
             if not common_name:
                 st.error("Please enter a site/device name")
-            elif not common_name.replace("-", "").replace("_", "").replace(".", "").isalnum():
+            elif not COMMON_NAME_PATTERN.fullmatch(common_name):
                 st.error("Name should only contain letters, numbers, hyphens, underscores, and dots")
             else:
                 with st.spinner("Generating certificate..."):
@@ -368,14 +707,17 @@ elif page == "Issue Certificate":
                     if cert_type == "Server" and sans_input:
                         sans = [s.strip() for s in sans_input.split(",")]
 
-                    success, message, files = issue_certificate(
+                    success, message, files, bundle = asyncio.run(issue_certificate(
                         common_name, cert_type, validity, sans
-                    )
+                    ))
 
                     if success:
                         st.success(message)
+                        # A re-issued CN does not change any directory mtime
+                        list_certificates.clear()
+                        _snapshot.clear()
                         # Store in session state for download button outside form
-                        st.session_state.cert_bundle = create_cert_bundle(common_name, files)
+                        st.session_state.cert_bundle = bundle
                         st.session_state.cert_name = common_name
                         st.session_state.cert_files = files
                     else:
@@ -413,20 +755,21 @@ elif page == "Issue Certificate":
 elif page == "View Certificates":
     st.header("Issued Certificates")
 
-    certs = list_certificates()
+    certs = list_certificates(certs_dir_mtime())
 
-    if certs:
+    if certs["cn"]:
         # Filter options
         status_filter = st.selectbox(
             "Filter by Status",
             ["All", "Active", "Expired"]
         )
 
+        certs_df = pd.DataFrame(certs)
         if status_filter != "All":
-            certs = [c for c in certs if c["status"] == status_filter]
+            certs_df = certs_df[certs_df["status"] == status_filter]
 
         st.dataframe(
-            certs,
+            certs_df,
             width='stretch',
             hide_index=True,
             column_config={
@@ -434,11 +777,12 @@ elif page == "View Certificates":
                 "issued": st.column_config.TextColumn("Issued", width="medium"),
                 "expires": st.column_config.TextColumn("Expires", width="medium"),
                 "serial": st.column_config.TextColumn("Serial", width="large"),
-                "status": st.column_config.TextColumn("Status", width="small")
+                "status": st.column_config.TextColumn("Status", width="small"),
+                "_expires_dt": None
             }
         )
 
-        st.caption(f"Total: {len(certs)} certificate(s)")
+        st.caption(f"Total: {len(certs_df)} certificate(s)")
     else:
         st.info("No certificates issued yet")
 
@@ -448,31 +792,50 @@ elif page == "Revoke Certificate":
 
     st.warning("Revoking a certificate is irreversible. The device will no longer be able to connect.")
 
-    certs = list_certificates()
-    active_certs = [c for c in certs if c["status"] == "Active"]
-
-    if active_certs:
-        cert_options = {c["cn"]: c for c in active_certs}
+    certs = list_certificates(certs_dir_mtime())
+    cert_options = {
+        cn: {"serial": serial, "expires": expires}
+        for cn, serial, expires, status in zip(
+            certs["cn"], certs["serial"], certs["expires"], certs["status"]
+        )
+        if status == "Active"
+    }
 
-        selected_cn = st.selectbox(
-            "Select Certificate to Revoke",
+    if cert_options:
+        selected_cns = st.multiselect(
+            "Select Certificates to Revoke",
             options=list(cert_options.keys())
         )
 
-        if selected_cn:
-            cert = cert_options[selected_cn]
-            st.info(f"Serial: {cert['serial']}\nExpires: {cert['expires']}")
+        if selected_cns:
+            for cn in selected_cns:
+                cert = cert_options[cn]
+                st.info(f"{cn}\nSerial: {cert['serial']}\nExpires: {cert['expires']}")
 
             confirm = st.checkbox("I understand this action cannot be undone")
 
-            if st.button("Revoke Certificate", type="primary", disabled=not confirm):
-                with st.spinner("Revoking certificate..."):
-                    success, message = revoke_certificate(selected_cn, cert["serial"])
-                    if success:
-                        st.success(message)
-                        st.rerun()
-                    else:
-                        st.error(message)
+            if st.button("Revoke Selected", type="primary", disabled=not confirm):
+                with st.spinner(f"Revoking {len(selected_cns)} certificate(s)..."):
+                    # Skip certificates already gone; revoke_certificate() reports them
+                    token_errors = asyncio.run(prefetch_revoke_tokens([
+                        cert_options[cn]["serial"] for cn in selected_cns
+                        if (CERTS_DIR / cn / f"{cn}.crt").exists()
+                    ]))
+                    failed = False
+                    for cn in selected_cns:
+                        serial = cert_options[cn]["serial"]
+                        if serial in token_errors:
+                            # Already failed once, don't mint again
+                            success, message = False, token_errors[serial]
+                        else:
+                            success, message = revoke_certificate(cn, serial)
+                        if success:
+                            st.success(f"{cn}: {message}")
+                        else:
+                            st.error(f"{cn}: {message}")
+                            failed = True
+                if not failed:
+                    st.rerun()
     else:
         st.info("No active certificates to revoke")
 
@@ -485,6 +848,11 @@ elif page == "CA Settings":
     with col1:
         st.subheader("CA Information")
 
+        # Fingerprint and bundle are cached; drop them if the CA was re-initialized
+        if st.button("Refresh CA info"):
+            _ca_fingerprint.clear()
+            _ca_bundle_bytes.clear()
+
         # Fingerprint
         fingerprint = get_ca_fingerprint()
         st.text_input("CA Fingerprint", value=fingerprint, disabled=True)
@@ -497,8 +865,7 @@ elif page == "CA Settings":
         st.subheader("Download CA Certificate Bundle")
 
         try:
-            with open(CA_BUNDLE, "r") as f:
-                ca_cert = f.read()
+            ca_cert = _ca_bundle_bytes()
 
             st.download_button(
                 label="Download CA Bundle (Intermediate + Root)",
@@ -511,7 +878,7 @@ elif page == "CA Settings":
             st.caption("This bundle includes Intermediate CA + Root CA. Required for mTLS client verification.")
 
             with st.expander("View CA Certificate"):
-                st.code(ca_cert, language="text")
+                st.code(ca_cert.decode(), language="text")
         except FileNotFoundError:
             st.error("CA certificate not found. Is step-ca running?")
 